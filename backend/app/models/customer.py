@@ -2,10 +2,13 @@
 Customer model for storing customer information and loyalty data
 """
 import uuid
+import time
+import secrets
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Integer, Text
+from sqlalchemy import Column, String, DateTime, Integer, Text, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import TypeDecorator, String as SQLString
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 import json
 
 from app.models.database import Base
@@ -17,7 +20,7 @@ class GUID(TypeDecorator):
 
     def load_dialect_impl(self, dialect):
         if dialect.name == 'postgresql':
-            return dialect.type_descriptor(dialect.UUID())
+            return dialect.type_descriptor(PG_UUID(as_uuid=True))
         else:
             return dialect.type_descriptor(SQLString(36))
 
@@ -25,23 +28,43 @@ class GUID(TypeDecorator):
         if value is None:
             return value
         elif dialect.name == 'postgresql':
-            return str(value)
+            # Hand uuid.UUID straight to the driver so it is sent as 16 binary
+            # bytes instead of a 36-char hex string
+            if not isinstance(value, uuid.UUID):
+                return uuid.UUID(value)
+            return value
         else:
             if not isinstance(value, uuid.UUID):
                 return str(uuid.UUID(value))
             else:
                 return str(value)
 
-    def process_result_value(self, value, dialect):
-        if value is None:
-            return value
-        else:
-            if not isinstance(value, uuid.UUID):
-                return uuid.UUID(value)
-            return value
+    def result_processor(self, dialect, coltype):
+        # The PostgreSQL driver already returns uuid.UUID objects, so skip
+        # per-row processing entirely; elsewhere use a single-frame converter
+        # rather than TypeDecorator's process_result_value wrapper
+        if dialect.name == 'postgresql':
+            return self.impl_instance.result_processor(dialect, coltype)
+        return _uuid_from_string
+
+
+def _uuid_from_string(value):
+    """Convert a stored UUID string back to uuid.UUID"""
+    return uuid.UUID(value) if value is not None else None
 
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = tuple(
+        # Trigram indexes on every searched column, so the list endpoint's
+        # name/email/phone ILIKE '%term%' OR can be answered by a bitmap OR
+        # of index scans instead of a seq scan
+        Index(
+            f"ix_customers_{column}_trgm", column,
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql")
+        for column in ("name", "email", "phone")
+    )
     
     id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     name = Column(String(100), nullable=False)
@@ -50,39 +73,51 @@ class Customer(Base):
     barcode = Column(String(50), nullable=True, unique=True)
     total_points = Column(Integer, default=0)
     total_spent = Column(Integer, default=0)  # in cents
-    joined_at = Column(DateTime, default=datetime.utcnow)
+    joined_at = Column(DateTime, default=datetime.utcnow, index=True)
     last_visit = Column(DateTime, nullable=True)
     notes = Column(Text, nullable=True)
     
-    # Relationships
-    purchases = relationship("Purchase", back_populates="customer")
-    scan_events = relationship("ScanEvent", back_populates="customer")
+    # Relationships (lazy="raise" so callers must eager-load explicitly
+    # instead of silently issuing one SELECT per parent row)
+    purchases = relationship("Purchase", back_populates="customer", lazy="raise")
+    scan_events = relationship("ScanEvent", back_populates="customer", lazy="raise")
     
     def to_dict(self):
-        """Convert customer to dictionary"""
+        """Convert customer to dictionary (UUID/datetime values are left for orjson)"""
         return {
-            "id": str(self.id),
+            "id": self.id,
             "name": self.name,
             "email": self.email,
             "phone": self.phone,
             "barcode": self.barcode,
             "total_points": self.total_points,
             "total_spent": self.total_spent,
-            "joined_at": self.joined_at.isoformat() if self.joined_at else None,
-            "last_visit": self.last_visit.isoformat() if self.last_visit else None,
+            "joined_at": self.joined_at,
+            "last_visit": self.last_visit,
             "notes": self.notes
         }
     
+    @staticmethod
+    def new_barcode() -> str:
+        """Build a new loyalty barcode"""
+        # ULID-style: 48-bit millisecond timestamp followed by 32 random
+        # bits, so codes sort by creation time and collisions need the
+        # same millisecond and the same random suffix
+        ulid = (time.time_ns() // 1_000_000) << 32 | secrets.randbits(32)
+        return f"LOY{ulid:020X}"
+
     def generate_barcode(self):
         """Generate a unique barcode for the customer"""
         if not self.barcode:
-            # Generate a simple numeric barcode based on timestamp and random
-            import time
-            import random
-            timestamp = str(int(time.time()))[-6:]  # Last 6 digits of timestamp
-            random_num = str(random.randint(1000, 9999))
-            self.barcode = f"LOY{timestamp}{random_num}"
+            self.barcode = self.new_barcode()
         return self.barcode
     
     def __repr__(self):
         return f"<Customer(id={self.id}, name='{self.name}', points={self.total_points})>"
+
+# gin_trgm_ops needs the pg_trgm extension before the tables are created
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
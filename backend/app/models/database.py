@@ -4,25 +4,73 @@ Database configuration and initialization
 import asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import logging
-from app.utils.config import Settings
+from app.utils.config import get_settings
 
 logger = logging.getLogger(__name__)
-settings = Settings()
+settings = get_settings()
+
+database_url = make_url(settings.database_url)
+is_sqlite = database_url.get_backend_name() == "sqlite"
+# sqlite:// with no path, "" or ":memory:" all open a private in-memory database
+is_sqlite_memory = is_sqlite and database_url.database in (None, "", ":memory:")
+
+# Server databases get an explicitly sized queue pool. File-backed SQLite
+# also keeps its connections open instead of reconnecting (and re-running
+# the pragmas below) per session; in-memory SQLite keeps the dialect default,
+# since every pooled connection would open its own empty database
+if not is_sqlite:
+    pool_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+elif not is_sqlite_memory:
+    pool_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": 0,
+        "connect_args": {"timeout": 30},  # wait on the write lock instead of failing
+    }
+else:
+    pool_options = {}
+
+# SQL logging is opt-in: echo formats and logs every statement, which
+# makes DEBUG runs far slower than production
+if settings.sql_echo:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 
 # Create async engine
 engine = create_async_engine(
     settings.database_url,
-    echo=settings.debug,
-    future=True
+    echo=False,
+    future=True,
+    **pool_options
 )
 
+if is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Enforce foreign keys and use WAL so readers don't block behind writes"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # Create session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
-    expire_on_commit=False
+    expire_on_commit=False,
+    autoflush=False  # routes commit explicitly
 )
 
 # Create base class for models
@@ -44,10 +92,19 @@ async def init_db():
         logger.error(f"Error initializing database: {e}")
         raise
 
+    if not is_sqlite:
+        await prewarm_pool(min(settings.db_pool_prewarm, settings.db_pool_size))
+
+async def prewarm_pool(count: int):
+    """Open and release connections so the first requests don't pay connect latency"""
+    try:
+        connections = await asyncio.gather(*(engine.connect().start() for _ in range(count)))
+        await asyncio.gather(*(conn.close() for conn in connections))
+        logger.info(f"Pre-warmed {count} database connections")
+    except Exception as e:
+        logger.warning(f"Error pre-warming connection pool: {e}")
+
 async def get_db():
-    """Dependency to get database session"""
+    """Dependency to get database session (closed by the context manager)"""
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
@@ -3,7 +3,7 @@ Purchase model for tracking customer purchases and loyalty points
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.models.database import Base
 from app.models.customer import GUID
@@ -22,7 +22,10 @@ class Purchase(Base):
     receipt_hash = Column(String(64), nullable=True)  # For duplicate detection
     
     # Relationship to customer
-    customer = relationship("Customer", back_populates="purchases")
+    customer = relationship("Customer", back_populates="purchases", lazy="raise")
+    
+    # (minimum amount in cents, bonus points), highest tier first
+    BONUS_TIERS = ((50000, 50), (25000, 25), (10000, 10))
     
     @property
     def amount_dollars(self):
@@ -34,35 +37,60 @@ class Purchase(Base):
         """Set amount from dollars"""
         self.amount_cents = int(value * 100)
     
+    @classmethod
+    def points_for(cls, amount_cents, points_per_dollar=1):
+        """Loyalty points earned for an amount in cents"""
+        base_points = amount_cents * points_per_dollar // 100
+        
+        # Bonus points for larger purchases (first matching tier wins)
+        bonus_points = next(
+            (bonus for minimum_cents, bonus in cls.BONUS_TIERS if amount_cents >= minimum_cents),
+            0
+        )
+        
+        return base_points + bonus_points
+    
     def calculate_points(self, points_per_dollar=1):
         """Calculate loyalty points for this purchase"""
-        base_points = int(self.amount_dollars * points_per_dollar)
-        
-        # Bonus points for larger purchases
-        if self.amount_dollars >= 500:
-            bonus_points = 50
-        elif self.amount_dollars >= 250:
-            bonus_points = 25
-        elif self.amount_dollars >= 100:
-            bonus_points = 10
-        else:
-            bonus_points = 0
-            
-        self.points_awarded = base_points + bonus_points
+        self.points_awarded = self.points_for(self.amount_cents, points_per_dollar)
         return self.points_awarded
     
     def to_dict(self):
-        """Convert purchase to dictionary"""
+        """Convert purchase to dictionary (UUID/datetime values are left for orjson)"""
         return {
-            "id": str(self.id),
-            "customer_id": str(self.customer_id) if self.customer_id else None,
+            "id": self.id,
+            "customer_id": self.customer_id,
             "receipt_number": self.receipt_number,
-            "amount_dollars": self.amount_dollars,
+            "amount_dollars": self.amount_cents / 100.0,
             "points_awarded": self.points_awarded,
-            "purchase_date": self.purchase_date.isoformat() if self.purchase_date else None,
+            "purchase_date": self.purchase_date,
             "cashier_station": self.cashier_station,
             "receipt_hash": self.receipt_hash
         }
     
     def __repr__(self):
         return f"<Purchase(id={self.id}, amount=${self.amount_dollars:.2f}, points={self.points_awarded})>"
+
+# Purchase lists are read newest-first with the id breaking timestamp ties;
+# this index serves the unfiltered list and date range filters
+Index("ix_purchases_purchase_date", Purchase.purchase_date.desc(), Purchase.id.desc())
+
+# Per-customer history is read the same way; this index serves the
+# WHERE customer_id = ? ORDER BY purchase_date DESC, id DESC range scan
+# directly
+Index(
+    "ix_purchases_customer_id_purchase_date",
+    Purchase.customer_id,
+    Purchase.purchase_date.desc(),
+    Purchase.id.desc()
+)
+
+# Covers every column the per-customer stats aggregate reads, so it can be
+# answered from the index without touching the table rows
+Index(
+    "ix_purchases_customer_stats",
+    Purchase.customer_id,
+    Purchase.amount_cents,
+    Purchase.points_awarded,
+    Purchase.purchase_date
+)
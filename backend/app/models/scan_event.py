@@ -3,31 +3,40 @@ Scan event model for tracking customer barcode scans
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from app.models.database import Base
 from app.models.customer import GUID
 
 class ScanEvent(Base):
     __tablename__ = "scan_events"
+    __table_args__ = (
+        # Partial index: only unmatched scans are looked up by time, and they
+        # are a small fraction of the table
+        Index(
+            "ix_scan_events_unmatched", "scanned_at",
+            postgresql_where=text("is_matched = false"),
+            sqlite_where=text("is_matched = 0")
+        ),
+    )
     
     id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     customer_id = Column(GUID(), ForeignKey("customers.id"), nullable=True)
     barcode_data = Column(String(50), nullable=False)
-    scanned_at = Column(DateTime, default=datetime.utcnow)
+    scanned_at = Column(DateTime, default=datetime.utcnow, index=True)
     is_matched = Column(Boolean, default=False)  # Whether matched to a purchase
     cashier_station = Column(String(20), nullable=True)  # Which station scanned
     
     # Relationship to customer
-    customer = relationship("Customer", back_populates="scan_events")
+    customer = relationship("Customer", back_populates="scan_events", lazy="raise")
     
     def to_dict(self):
-        """Convert scan event to dictionary"""
+        """Convert scan event to dictionary (UUID/datetime values are left for orjson)"""
         return {
-            "id": str(self.id),
-            "customer_id": str(self.customer_id) if self.customer_id else None,
+            "id": self.id,
+            "customer_id": self.customer_id,
             "barcode_data": self.barcode_data,
-            "scanned_at": self.scanned_at.isoformat() if self.scanned_at else None,
+            "scanned_at": self.scanned_at,
             "is_matched": self.is_matched,
             "cashier_station": self.cashier_station
         }
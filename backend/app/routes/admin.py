@@ -1,13 +1,17 @@
 """
 Admin and system management API routes
 """
+import asyncio
 import logging
+import time
 from typing import Dict, Any, List
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from pydantic import BaseModel
-from app.models.database import get_db
+from app.models.database import get_db, AsyncSessionLocal
 from app.models.customer import Customer
 from app.models.purchase import Purchase
 from app.models.scan_event import ScanEvent
@@ -15,6 +19,14 @@ from app.models.scan_event import ScanEvent
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Rows fetched per round-trip when streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+# System stats change slowly; serve them from memory between refreshes
+STATS_CACHE_TTL_SECONDS = 30
+_stats_cache: Dict[str, Any] = {"value": None, "expires_at": 0.0}
+_stats_lock = asyncio.Lock()
+
 # Pydantic models for admin responses
 class SystemStats(BaseModel):
     total_customers: int
@@ -27,42 +39,45 @@ class SystemStats(BaseModel):
 class TestReceiptRequest(BaseModel):
     receipt_text: str
 
+async def _query_system_stats(db: AsyncSession) -> SystemStats:
+    """Compute system statistics from the database"""
+    # Single round-trip: purchase aggregates plus customer/scan counts
+    # as scalar subqueries
+    stats_result = await db.execute(
+        select(
+            select(func.count(Customer.id)).scalar_subquery().label('total_customers'),
+            func.count(Purchase.id).label('total_purchases'),
+            func.sum(Purchase.amount_cents).label('total_revenue_cents'),
+            func.sum(Purchase.points_awarded).label('total_points_awarded'),
+            func.avg(Purchase.amount_cents).label('avg_purchase_cents'),
+            select(func.count(ScanEvent.id)).scalar_subquery().label('total_scan_events')
+        ).select_from(Purchase)
+    )
+    stats = stats_result.first()
+    
+    return SystemStats(
+        total_customers=stats.total_customers or 0,
+        total_purchases=stats.total_purchases or 0,
+        # Amounts are stored in cents; convert the aggregates once
+        total_revenue=float(stats.total_revenue_cents or 0) / 100.0,
+        total_points_awarded=stats.total_points_awarded or 0,
+        total_scan_events=stats.total_scan_events or 0,
+        avg_purchase_amount=float(stats.avg_purchase_cents or 0) / 100.0
+    )
+
 @router.get("/stats", response_model=SystemStats)
 async def get_system_stats(db: AsyncSession = Depends(get_db)):
-    """Get overall system statistics"""
+    """Get overall system statistics (cached for STATS_CACHE_TTL_SECONDS)"""
     try:
-        # Get customer count
-        customer_count_result = await db.execute(select(func.count(Customer.id)))
-        total_customers = customer_count_result.scalar() or 0
-        
-        # Get purchase statistics
-        purchase_stats_result = await db.execute(
-            select(
-                func.count(Purchase.id),
-                func.sum(Purchase.amount),
-                func.sum(Purchase.points_awarded),
-                func.avg(Purchase.amount)
-            )
-        )
-        purchase_stats = purchase_stats_result.first()
-        
-        total_purchases = purchase_stats[0] or 0
-        total_revenue = float(purchase_stats[1] or 0)
-        total_points_awarded = purchase_stats[2] or 0
-        avg_purchase_amount = float(purchase_stats[3] or 0)
+        if time.monotonic() < _stats_cache["expires_at"]:
+            return _stats_cache["value"]
         
-        # Get scan event count
-        scan_count_result = await db.execute(select(func.count(ScanEvent.id)))
-        total_scan_events = scan_count_result.scalar() or 0
-        
-        return SystemStats(
-            total_customers=total_customers,
-            total_purchases=total_purchases,
-            total_revenue=total_revenue,
-            total_points_awarded=total_points_awarded,
-            total_scan_events=total_scan_events,
-            avg_purchase_amount=avg_purchase_amount
-        )
+        # Only one request recomputes; concurrent callers wait and reuse it
+        async with _stats_lock:
+            if time.monotonic() >= _stats_cache["expires_at"]:
+                _stats_cache["value"] = await _query_system_stats(db)
+                _stats_cache["expires_at"] = time.monotonic() + STATS_CACHE_TTL_SECONDS
+            return _stats_cache["value"]
         
     except Exception as e:
         logger.error(f"Error getting system stats: {e}")
@@ -202,31 +217,42 @@ async def reset_tablet():
 async def export_system_data(
     format: str = "json",
     include_customers: bool = True,
-    include_purchases: bool = True,
-    db: AsyncSession = Depends(get_db)
+    include_purchases: bool = True
 ):
-    """Export system data for backup or analysis"""
-    try:
-        export_data = {}
-        
-        if include_customers:
-            customers_result = await db.execute(select(Customer))
-            customers = customers_result.scalars().all()
-            export_data["customers"] = [customer.to_dict() for customer in customers]
-        
-        if include_purchases:
-            purchases_result = await db.execute(select(Purchase))
-            purchases = purchases_result.scalars().all()
-            export_data["purchases"] = [purchase.to_dict() for purchase in purchases]
-        
-        export_data["exported_at"] = "2024-01-01T00:00:00Z"
-        export_data["format"] = format
-        
-        return export_data
-        
-    except Exception as e:
-        logger.error(f"Error exporting data: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error exporting system data"
-        )
+    """
+    Export system data for backup or analysis
+
+    Streams newline-delimited JSON: a header line followed by one
+    {"table": ..., "row": ...} line per record, fetched in batches so the
+    full tables are never held in memory.
+    """
+    async def generate_rows():
+        # Own session: the response body is produced after the handler returns
+        async with AsyncSessionLocal() as session:
+            try:
+                yield orjson.dumps({
+                    "exported_at": "2024-01-01T00:00:00Z",
+                    "format": format
+                }) + b"\n"
+
+                tables = []
+                if include_customers:
+                    tables.append(("customers", Customer))
+                if include_purchases:
+                    tables.append(("purchases", Purchase))
+
+                for table_name, model in tables:
+                    result = await session.stream(
+                        select(model).execution_options(yield_per=EXPORT_BATCH_SIZE)
+                    )
+                    async for partition in result.scalars().partitions():
+                        yield b"".join(
+                            orjson.dumps({"table": table_name, "row": row.to_dict()}) + b"\n"
+                            for row in partition
+                        )
+
+            except Exception as e:
+                logger.error(f"Error exporting data: {e}")
+                raise
+
+    return StreamingResponse(generate_rows(), media_type="application/x-ndjson")
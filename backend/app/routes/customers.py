@@ -4,12 +4,19 @@ Customer management API routes
 import logging
 from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from pydantic import BaseModel
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.orm import load_only
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel, ConfigDict
 from app.models.database import get_db
 from app.models.customer import Customer
+from app.models.purchase import Purchase
+from app.models.scan_event import ScanEvent
+from app.routes.purchases import invalidate_customer_stats
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -28,15 +35,19 @@ class CustomerUpdate(BaseModel):
     notes: Optional[str] = None
 
 class CustomerResponse(BaseModel):
-    id: str
+    # Built straight from Customer rows; FastAPI validates the ORM object
+    # once instead of going through to_dict() and a second model
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
     name: str
     email: Optional[str]
     phone: Optional[str]
     barcode: Optional[str]
     total_points: int
     total_spent: int
-    joined_at: Optional[str]
-    last_visit: Optional[str]
+    joined_at: Optional[datetime]
+    last_visit: Optional[datetime]
     notes: Optional[str]
 
 @router.post("/", response_model=CustomerResponse, status_code=status.HTTP_201_CREATED)
@@ -46,25 +57,34 @@ async def create_customer(
 ):
     """Create a new customer"""
     try:
-        # Create new customer
-        customer = Customer(
-            name=customer_data.name,
-            email=customer_data.email,
-            phone=customer_data.phone,
-            notes=customer_data.notes
+        # Single INSERT ... RETURNING: column defaults are applied in the
+        # statement and the row comes back without a follow-up SELECT
+        result = await db.execute(
+            insert(Customer)
+            .values(
+                name=customer_data.name,
+                email=customer_data.email,
+                phone=customer_data.phone,
+                notes=customer_data.notes,
+                barcode=Customer.new_barcode()
+            )
+            .returning(Customer)
         )
-        
-        # Generate barcode for new customer
-        customer.generate_barcode()
-        
-        db.add(customer)
+        customer = result.scalar_one()
         await db.commit()
-        await db.refresh(customer)
         
         logger.info(f"Created new customer: {customer.name} ({customer.barcode})")
         
-        return CustomerResponse(**customer.to_dict())
+        return customer
         
+    except IntegrityError as e:
+        # Barcodes are unique by construction, so this is a duplicate email
+        await db.rollback()
+        logger.warning(f"Rejected duplicate customer: {e.orig}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A customer with this email already exists"
+        )
     except Exception as e:
         await db.rollback()
         logger.error(f"Error creating customer: {e}")
@@ -89,7 +109,7 @@ async def get_customer(
                 detail="Customer not found"
             )
         
-        return CustomerResponse(**customer.to_dict())
+        return customer
         
     except HTTPException:
         raise
@@ -116,7 +136,7 @@ async def get_customer_by_barcode(
                 detail="Customer not found"
             )
         
-        return CustomerResponse(**customer.to_dict())
+        return customer
         
     except HTTPException:
         raise
@@ -132,12 +152,29 @@ async def list_customers(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    fields: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """List customers with optional search"""
+    """
+    List customers with optional search
+    
+    `fields` is an optional comma-separated subset of CustomerResponse
+    fields; only those columns are read from the database and returned.
+    """
     try:
         query = select(Customer)
         
+        selected_fields = None
+        if fields:
+            selected_fields = ["id"] + [f for f in fields.split(",") if f and f != "id"]
+            unknown = set(selected_fields) - CustomerResponse.model_fields.keys()
+            if unknown:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+                )
+            query = query.options(load_only(*(getattr(Customer, f) for f in selected_fields)))
+        
         # Add search filter if provided
         if search:
             search_filter = f"%{search}%"
@@ -153,8 +190,17 @@ async def list_customers(
         result = await db.execute(query)
         customers = result.scalars().all()
         
-        return [CustomerResponse(**customer.to_dict()) for customer in customers]
+        if selected_fields:
+            # Partial rows don't satisfy CustomerResponse; emit them directly
+            return ORJSONResponse([
+                {f: getattr(customer, f) for f in selected_fields}
+                for customer in customers
+            ])
+        
+        return customers
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing customers: {e}")
         raise HTTPException(
@@ -170,7 +216,18 @@ async def update_customer(
 ):
     """Update customer information"""
     try:
-        result = await db.execute(select(Customer).where(Customer.id == customer_id))
+        changes = customer_data.model_dump(exclude_none=True)
+        
+        # UPDATE ... RETURNING finds and modifies the row in one round-trip
+        if changes:
+            result = await db.execute(
+                update(Customer)
+                .where(Customer.id == customer_id)
+                .values(**changes)
+                .returning(Customer)
+            )
+        else:
+            result = await db.execute(select(Customer).where(Customer.id == customer_id))
         customer = result.scalar_one_or_none()
         
         if not customer:
@@ -179,25 +236,21 @@ async def update_customer(
                 detail="Customer not found"
             )
         
-        # Update fields if provided
-        if customer_data.name is not None:
-            customer.name = customer_data.name
-        if customer_data.email is not None:
-            customer.email = customer_data.email
-        if customer_data.phone is not None:
-            customer.phone = customer_data.phone
-        if customer_data.notes is not None:
-            customer.notes = customer_data.notes
-        
         await db.commit()
-        await db.refresh(customer)
         
         logger.info(f"Updated customer: {customer.name} ({customer.barcode})")
         
-        return CustomerResponse(**customer.to_dict())
+        return customer
         
     except HTTPException:
         raise
+    except IntegrityError as e:
+        await db.rollback()
+        logger.warning(f"Rejected duplicate email for customer {customer_id}: {e.orig}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A customer with this email already exists"
+        )
     except Exception as e:
         await db.rollback()
         logger.error(f"Error updating customer {customer_id}: {e}")
@@ -213,17 +266,29 @@ async def delete_customer(
 ):
     """Delete customer"""
     try:
-        result = await db.execute(select(Customer).where(Customer.id == customer_id))
-        customer = result.scalar_one_or_none()
+        # Detach history rows, then delete with RETURNING; no prior SELECT
+        await db.execute(
+            update(Purchase).where(Purchase.customer_id == customer_id).values(customer_id=None)
+        )
+        await db.execute(
+            update(ScanEvent).where(ScanEvent.customer_id == customer_id).values(customer_id=None)
+        )
+        result = await db.execute(
+            delete(Customer)
+            .where(Customer.id == customer_id)
+            .returning(Customer.name, Customer.barcode)
+        )
+        customer = result.first()
         
         if not customer:
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Customer not found"
             )
         
-        await db.delete(customer)
         await db.commit()
+        invalidate_customer_stats(customer_id)
         
         logger.info(f"Deleted customer: {customer.name} ({customer.barcode})")
         
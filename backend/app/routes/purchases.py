@@ -2,17 +2,21 @@
 Purchase management API routes
 """
 import logging
-from typing import List, Optional
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
 from uuid import UUID
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime, time as dt_time, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from pydantic import BaseModel
+from sqlalchemy import select, insert, func, and_, or_, exists
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from app.models.database import get_db
 from app.models.purchase import Purchase
 from app.models.customer import Customer
 from app.models.scan_event import ScanEvent
+from app.utils.config import Settings, get_settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -26,14 +30,74 @@ class PurchaseCreate(BaseModel):
     items_count: Optional[int] = 0
 
 class PurchaseResponse(BaseModel):
-    id: str
-    customer_id: str
-    receipt_id: Optional[str]
-    timestamp: Optional[str]
-    amount: float
+    # Read straight off Purchase rows; aliases map the column names onto
+    # the public field names the clients use
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+    
+    id: UUID
+    customer_id: Optional[UUID]
+    receipt_id: Optional[str] = Field(validation_alias="receipt_number")
+    timestamp: Optional[datetime] = Field(validation_alias="purchase_date")
+    amount: float = Field(validation_alias="amount_dollars")
     points_awarded: int
-    items_count: int
-    processed_at: Optional[str]
+    items_count: int = 0
+    processed_at: Optional[datetime] = None
+
+# Built once so list endpoints serialize a page in pydantic-core
+_purchase_list_adapter = TypeAdapter(List[PurchaseResponse])
+
+# List endpoints fetch plain rows of just these columns, skipping ORM hydration
+_PURCHASE_LIST_COLUMNS = (
+    Purchase.id,
+    Purchase.customer_id,
+    Purchase.receipt_number,
+    Purchase.purchase_date,
+    Purchase.amount_cents,
+    Purchase.points_awarded
+)
+
+async def _fetch_purchase_page(db: AsyncSession, query) -> List[PurchaseResponse]:
+    """Run a purchase list query and build responses without re-validating database values"""
+    result = await db.execute(query)
+    return [
+        PurchaseResponse.model_construct(
+            id=row.id,
+            customer_id=row.customer_id,
+            receipt_id=row.receipt_number,
+            timestamp=row.purchase_date,
+            amount=row.amount_cents / 100.0,
+            points_awarded=row.points_awarded
+        )
+        for row in result.all()
+    ]
+
+# Pages are ordered newest-first with the id breaking timestamp ties, so
+# the keyset cursor is the (purchase_date, id) of the last row
+_PURCHASE_LIST_ORDER = (Purchase.purchase_date.desc(), Purchase.id.desc())
+
+def _purchase_list_response(purchases: List[PurchaseResponse], limit: int) -> Response:
+    """Serialize a page of purchases, exposing the next keyset cursor when the page is full"""
+    response = Response(
+        content=_purchase_list_adapter.dump_json(purchases),
+        media_type="application/json"
+    )
+    if purchases and len(purchases) == limit and purchases[-1].timestamp:
+        response.headers["X-Next-Before"] = purchases[-1].timestamp.isoformat()
+        response.headers["X-Next-Before-Id"] = str(purchases[-1].id)
+    return response
+
+def _before_cursor(before: datetime, before_id: Optional[UUID]):
+    """Filter for rows after the keyset cursor in _PURCHASE_LIST_ORDER"""
+    if before_id is None:
+        return Purchase.purchase_date < before
+    return or_(
+        Purchase.purchase_date < before,
+        and_(Purchase.purchase_date == before, Purchase.id < before_id)
+    )
+
+def _as_datetime(value: Union[datetime, date]) -> datetime:
+    """Treat a bare date filter as midnight, as datetime.fromisoformat did"""
+    return value if isinstance(value, datetime) else datetime.combine(value, dt_time.min)
 
 class CustomerPurchaseStats(BaseModel):
     customer_id: str
@@ -43,45 +107,54 @@ class CustomerPurchaseStats(BaseModel):
     first_purchase: Optional[str]
     last_purchase: Optional[str]
 
+# Customer stats are polled by the UIs; serve them from memory between
+# refreshes and drop a customer's entry whenever their purchases change.
+# Least recently used entries are evicted one at a time past the cap
+CUSTOMER_STATS_CACHE_TTL_SECONDS = 30
+CUSTOMER_STATS_CACHE_MAX_ENTRIES = 1024
+_customer_stats_cache: "OrderedDict[UUID, Tuple[float, CustomerPurchaseStats]]" = OrderedDict()
+
+def invalidate_customer_stats(customer_id: UUID):
+    """Forget cached purchase statistics for a customer"""
+    _customer_stats_cache.pop(customer_id, None)
+
 @router.post("/", response_model=PurchaseResponse, status_code=status.HTTP_201_CREATED)
 async def create_purchase(
     purchase_data: PurchaseCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     """Create a new purchase and award loyalty points"""
     try:
-        # Verify customer exists
-        result = await db.execute(select(Customer).where(Customer.id == purchase_data.customer_id))
-        customer = result.scalar_one_or_none()
-        
-        if not customer:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Customer not found"
+        amount_cents = round(purchase_data.amount * 100)
+        
+        # One INSERT ... RETURNING; an unknown customer is rejected by the
+        # foreign key instead of a separate existence SELECT
+        result = await db.execute(
+            insert(Purchase)
+            .values(
+                customer_id=purchase_data.customer_id,
+                receipt_number=purchase_data.receipt_id,
+                amount_cents=amount_cents,
+                receipt_text=purchase_data.receipt_text,
+                points_awarded=Purchase.points_for(amount_cents, settings.points_per_dollar)
             )
-        
-        # Create purchase record
-        purchase = Purchase(
-            customer_id=purchase_data.customer_id,
-            receipt_id=purchase_data.receipt_id,
-            amount=purchase_data.amount,
-            receipt_text=purchase_data.receipt_text,
-            items_count=purchase_data.items_count or 0
+            .returning(Purchase)
         )
-        
-        # Calculate and award points
-        points_awarded = purchase.calculate_points()
-        
-        db.add(purchase)
+        purchase = result.scalar_one()
         await db.commit()
-        await db.refresh(purchase)
+        invalidate_customer_stats(purchase.customer_id)
         
-        logger.info(f"Created purchase for customer {customer.name}: ${purchase.amount}, {points_awarded} points")
+        logger.info(f"Created purchase for customer {purchase.customer_id}: ${purchase.amount_dollars:.2f}, {purchase.points_awarded} points")
         
-        return PurchaseResponse(**purchase.to_dict())
+        return purchase
         
-    except HTTPException:
-        raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Customer not found"
+        )
     except Exception as e:
         await db.rollback()
         logger.error(f"Error creating purchase: {e}")
@@ -106,7 +179,7 @@ async def get_purchase(
                 detail="Purchase not found"
             )
         
-        return PurchaseResponse(**purchase.to_dict())
+        return purchase
         
     except HTTPException:
         raise
@@ -122,29 +195,38 @@ async def get_customer_purchases(
     customer_id: UUID,
     skip: int = 0,
     limit: int = 50,
+    before: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all purchases for a customer"""
+    """
+    Get all purchases for a customer
+    
+    Pass the previous page's X-Next-Before and X-Next-Before-Id headers as
+    `before` and `before_id` to page by keyset instead of `skip`, which
+    avoids scanning the skipped rows.
+    """
     try:
-        # Verify customer exists
-        result = await db.execute(select(Customer).where(Customer.id == customer_id))
-        customer = result.scalar_one_or_none()
-        
-        if not customer:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Customer not found"
-            )
-        
         # Get purchases
-        query = select(Purchase).where(Purchase.customer_id == customer_id)\
-                                .order_by(Purchase.timestamp.desc())\
-                                .offset(skip).limit(limit)
+        query = select(*_PURCHASE_LIST_COLUMNS).where(Purchase.customer_id == customer_id)
+        if before:
+            query = query.where(_before_cursor(before, before_id))
+        query = query.order_by(*_PURCHASE_LIST_ORDER).offset(skip).limit(limit)
         
-        result = await db.execute(query)
-        purchases = result.scalars().all()
+        purchases = await _fetch_purchase_page(db, query)
         
-        return [PurchaseResponse(**purchase.to_dict()) for purchase in purchases]
+        # Only an empty page needs to tell "no purchases" from "no customer"
+        if not purchases:
+            customer_exists = await db.scalar(
+                select(exists().where(Customer.id == customer_id))
+            )
+            if not customer_exists:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Customer not found"
+                )
+        
+        return _purchase_list_response(purchases, limit)
         
     except HTTPException:
         raise
@@ -160,39 +242,53 @@ async def get_customer_purchase_stats(
     customer_id: UUID,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get purchase statistics for a customer"""
+    """Get purchase statistics for a customer (cached for CUSTOMER_STATS_CACHE_TTL_SECONDS)"""
     try:
-        # Verify customer exists
-        result = await db.execute(select(Customer).where(Customer.id == customer_id))
-        customer = result.scalar_one_or_none()
-        
-        if not customer:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Customer not found"
-            )
+        cached = _customer_stats_cache.get(customer_id)
+        if cached and time.monotonic() < cached[0]:
+            _customer_stats_cache.move_to_end(customer_id)
+            return cached[1]
         
-        # Get purchase statistics
+        # Aggregate over customer LEFT JOIN purchases: one round-trip that
+        # also tells whether the customer exists
         stats_query = select(
-            func.count(Purchase.id).label('total_purchases'),
-            func.sum(Purchase.amount).label('total_spent'),
+            func.count(Customer.id).label('customer_rows'),
+            # customer_id is non-null exactly on joined rows and sits in the
+            # covering index, unlike id
+            func.count(Purchase.customer_id).label('total_purchases'),
+            func.sum(Purchase.amount_cents).label('total_spent_cents'),
             func.sum(Purchase.points_awarded).label('total_points'),
-            func.min(Purchase.timestamp).label('first_purchase'),
-            func.max(Purchase.timestamp).label('last_purchase')
-        ).where(Purchase.customer_id == customer_id)
+            func.min(Purchase.purchase_date).label('first_purchase'),
+            func.max(Purchase.purchase_date).label('last_purchase')
+        ).select_from(Customer)\
+         .outerjoin(Purchase, Purchase.customer_id == Customer.id)\
+         .where(Customer.id == customer_id)
         
         result = await db.execute(stats_query)
         stats = result.first()
         
-        return CustomerPurchaseStats(
+        if not stats.customer_rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Customer not found"
+            )
+        
+        customer_stats = CustomerPurchaseStats(
             customer_id=str(customer_id),
             total_purchases=stats.total_purchases or 0,
-            total_spent=float(stats.total_spent or 0),
+            total_spent=float(stats.total_spent_cents or 0) / 100.0,
             total_points=stats.total_points or 0,
             first_purchase=stats.first_purchase.isoformat() if stats.first_purchase else None,
             last_purchase=stats.last_purchase.isoformat() if stats.last_purchase else None
         )
         
+        _customer_stats_cache[customer_id] = (time.monotonic() + CUSTOMER_STATS_CACHE_TTL_SECONDS, customer_stats)
+        _customer_stats_cache.move_to_end(customer_id)
+        if len(_customer_stats_cache) > CUSTOMER_STATS_CACHE_MAX_ENTRIES:
+            _customer_stats_cache.popitem(last=False)
+        
+        return customer_stats
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -207,13 +303,15 @@ async def list_purchases(
     skip: int = 0,
     limit: int = 100,
     customer_id: Optional[UUID] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    start_date: Optional[Union[datetime, date]] = None,
+    end_date: Optional[Union[datetime, date]] = None,
+    before: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """List purchases with optional filters"""
+    """List purchases with optional filters (keyset paging via `before`/`before_id`, see get_customer_purchases)"""
     try:
-        query = select(Purchase)
+        query = select(*_PURCHASE_LIST_COLUMNS)
         
         # Apply filters
         filters = []
@@ -222,35 +320,23 @@ async def list_purchases(
             filters.append(Purchase.customer_id == customer_id)
         
         if start_date:
-            try:
-                start_dt = datetime.fromisoformat(start_date)
-                filters.append(Purchase.timestamp >= start_dt)
-            except ValueError:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid start_date format. Use ISO format."
-                )
+            filters.append(Purchase.purchase_date >= _as_datetime(start_date))
         
         if end_date:
-            try:
-                end_dt = datetime.fromisoformat(end_date)
-                filters.append(Purchase.timestamp <= end_dt)
-            except ValueError:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid end_date format. Use ISO format."
-                )
+            filters.append(Purchase.purchase_date <= _as_datetime(end_date))
+        
+        if before:
+            filters.append(_before_cursor(before, before_id))
         
         if filters:
             query = query.where(and_(*filters))
         
         # Add ordering and pagination
-        query = query.order_by(Purchase.timestamp.desc()).offset(skip).limit(limit)
+        query = query.order_by(*_PURCHASE_LIST_ORDER).offset(skip).limit(limit)
         
-        result = await db.execute(query)
-        purchases = result.scalars().all()
+        purchases = await _fetch_purchase_page(db, query)
         
-        return [PurchaseResponse(**purchase.to_dict()) for purchase in purchases]
+        return _purchase_list_response(purchases, limit)
         
     except HTTPException:
         raise
@@ -265,7 +351,8 @@ async def list_purchases(
 async def process_barcode_purchase(
     barcode: str,
     receipt_data: dict,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     """Process a purchase based on customer barcode scan and receipt data"""
     try:
@@ -279,37 +366,34 @@ async def process_barcode_purchase(
                 detail="Customer not found for barcode"
             )
         
-        # Create scan event
+        # Scan event and purchase go out in the commit's single flush; their
+        # primary keys and dates are client-side defaults, so no refresh is
+        # needed to build the response
         scan_event = ScanEvent(
             customer_id=customer.id,
             barcode_data=barcode,
             is_matched=True
         )
-        db.add(scan_event)
         
-        # Create purchase
+        amount_cents = round(float(receipt_data.get('total') or 0) * 100)
         purchase = Purchase(
             customer_id=customer.id,
-            receipt_id=receipt_data.get('receipt_id'),
-            amount=receipt_data.get('total', 0),
+            receipt_number=receipt_data.get('receipt_id'),
+            amount_cents=amount_cents,
             receipt_text=receipt_data.get('raw_text'),
-            items_count=receipt_data.get('items_count', 0)
+            points_awarded=Purchase.points_for(amount_cents, settings.points_per_dollar)
         )
         
-        # Calculate points
-        points_awarded = purchase.calculate_points()
-        
-        db.add(purchase)
+        db.add_all([scan_event, purchase])
         await db.commit()
-        await db.refresh(purchase)
-        await db.refresh(scan_event)
+        invalidate_customer_stats(customer.id)
         
-        logger.info(f"Processed barcode purchase: {customer.name}, ${purchase.amount}, {points_awarded} points")
+        logger.info(f"Processed barcode purchase: {customer.name}, ${purchase.amount_dollars:.2f}, {purchase.points_awarded} points")
         
         return {
             "purchase": purchase.to_dict(),
             "customer": customer.to_dict(),
-            "points_awarded": points_awarded
+            "points_awarded": purchase.points_awarded
         }
         
     except HTTPException:
@@ -4,31 +4,53 @@ Receipt monitoring service for detecting and parsing printed receipts
 import asyncio
 import logging
 import os
+import sys
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
+import aiofiles
+import aiofiles.os
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
 from app.utils.receipt_parser import ReceiptParser
-from app.utils.config import settings
+from app.utils.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Number of processed receipt paths remembered for de-duplication
+MAX_PROCESSED_FILES = 1000
+
+# File extensions that might contain receipt data
+RECEIPT_EXTENSIONS = ('.txt', '.prn', '.spl', '.log')
+
+# Text encodings tried, in order, on the bytes of a receipt file
+RECEIPT_ENCODINGS = ('utf-8', 'cp1252', 'ascii')
+
+# bytes.translate table keeping printable ASCII and turning every other byte into a newline
+_PRINT_TABLE = bytes(b if 32 <= b <= 126 else 0x0A for b in range(256))
+
 class ReceiptFileHandler(FileSystemEventHandler):
-    """File system event handler for receipt monitoring"""
+    """File system event handler for receipt monitoring
+    
+    Watchdog calls these handlers on its observer thread, so work is handed
+    to the monitor's event loop with run_coroutine_threadsafe.
+    """
     
-    def __init__(self, receipt_monitor):
+    def __init__(self, receipt_monitor, loop: asyncio.AbstractEventLoop):
         self.receipt_monitor = receipt_monitor
+        self.loop = loop
         
     def on_created(self, event):
         """Handle file creation events"""
         if not event.is_directory:
-            asyncio.create_task(self.receipt_monitor.process_new_file(event.src_path))
+            asyncio.run_coroutine_threadsafe(self.receipt_monitor.process_new_file(event.src_path), self.loop)
     
     def on_modified(self, event):
         """Handle file modification events"""
         if not event.is_directory:
-            asyncio.create_task(self.receipt_monitor.process_modified_file(event.src_path))
+            asyncio.run_coroutine_threadsafe(self.receipt_monitor.process_modified_file(event.src_path), self.loop)
 
 class ReceiptMonitor:
     """Monitors for new receipts and processes them for loyalty integration"""
@@ -37,23 +59,36 @@ class ReceiptMonitor:
         self.websocket_manager = websocket_manager
         self.receipt_parser = ReceiptParser()
         self.observer = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
         self.is_monitoring = False
-        self.processed_files = set()
+        self.processed_files: OrderedDict[str, None] = OrderedDict()
+        self.files_in_progress = set()
+        # Paths that received another event while they were being handled
+        self.files_changed_in_progress = set()
+        
+        # Bound once; these are read on every file event and scan match
+        settings = get_settings()
+        self.monitor_enabled = settings.receipt_monitor_enabled
+        self.monitor_path = settings.receipt_folder_path
+        self.match_window_seconds = settings.receipt_match_window_seconds
         self.pending_customer_scans: List[Dict] = []
         
     async def start_monitoring(self):
         """Start monitoring for receipt files"""
-        if not settings.receipt_monitor_enabled:
+        if not self.monitor_enabled:
             logger.info("Receipt monitoring disabled in settings")
             return
             
         try:
             # Create observer for file system events
-            self.observer = Observer()
-            event_handler = ReceiptFileHandler(self)
+            self.loop = asyncio.get_running_loop()
+            # Windows print spoolers don't reliably raise native close events,
+            # so poll there instead
+            self.observer = PollingObserver(timeout=1.0) if sys.platform == 'win32' else Observer()
+            event_handler = ReceiptFileHandler(self, self.loop)
             
             # Monitor the print spool directory
-            monitor_path = settings.receipt_folder_path
+            monitor_path = self.monitor_path
             if os.path.exists(monitor_path):
                 self.observer.schedule(event_handler, monitor_path, recursive=False)
                 self.observer.start()
@@ -91,70 +126,102 @@ class ReceiptMonitor:
             if file_path in self.processed_files:
                 return
                 
-            # Wait a moment for file to be fully written
-            await asyncio.sleep(0.5)
-            
             # Check if file looks like a receipt
             if not self._is_receipt_file(file_path):
                 return
                 
-            # Read file content
-            receipt_content = await self._read_receipt_file(file_path)
-            if not receipt_content:
-                return
-                
-            # Parse receipt
-            parsed_receipt = self.receipt_parser.parse_receipt(receipt_content)
-            
-            # Validate receipt
-            if not self.receipt_parser.is_valid_receipt(receipt_content):
-                logger.debug(f"File {file_path} doesn't appear to be a valid receipt")
+            # Another event is handling this path; have it check the file
+            # again when its current pass ends instead of dropping this one
+            if file_path in self.files_in_progress:
+                self.files_changed_in_progress.add(file_path)
                 return
                 
-            # Mark as processed
-            self.processed_files.add(file_path)
-            
-            # Try to match with recent customer scan
-            customer_match = await self._match_customer_scan(parsed_receipt)
-            
-            if customer_match:
-                await self._process_customer_purchase(customer_match, parsed_receipt)
-            else:
-                logger.info(f"No customer match found for receipt: {parsed_receipt.get('receipt_id', 'unknown')}")
+            self.files_in_progress.add(file_path)
+            try:
+                while True:
+                    self.files_changed_in_progress.discard(file_path)
+                    await self._handle_receipt_file(file_path)
+                    if file_path in self.processed_files or file_path not in self.files_changed_in_progress:
+                        break
+            finally:
+                self.files_in_progress.discard(file_path)
+                self.files_changed_in_progress.discard(file_path)
                 
         except Exception as e:
             logger.error(f"Error processing receipt file {file_path}: {e}")
     
-    def _is_receipt_file(self, file_path: str) -> bool:
-        """Check if file appears to be a receipt"""
-        filename = os.path.basename(file_path).lower()
+    async def _handle_receipt_file(self, file_path: str):
+        """Read, parse and match a receipt file once it has been fully written"""
+        # Wait for the printer driver to finish writing; if the file is
+        # still growing, the write event that follows is handled later
+        if not await self._wait_stable(file_path):
+            return
+            
+        # Read file content
+        receipt_content = await self._read_receipt_file(file_path)
+        if not receipt_content:
+            return
+            
+        # Validate receipt before the full parse so other spool files
+        # never reach the item scan
+        if not self.receipt_parser.is_valid_receipt(receipt_content):
+            logger.debug(f"File {file_path} doesn't appear to be a valid receipt")
+            return
+            
+        # Parse receipt
+        parsed_receipt = self.receipt_parser.parse_receipt(receipt_content)
         
-        # Check file extensions that might contain receipt data
-        receipt_extensions = ['.txt', '.prn', '.spl', '.log']
+        # Mark as processed, evicting the oldest path once the cap is reached
+        self.processed_files[file_path] = None
+        if len(self.processed_files) > MAX_PROCESSED_FILES:
+            self.processed_files.popitem(last=False)
         
-        return any(filename.endswith(ext) for ext in receipt_extensions)
+        # Try to match with recent customer scan
+        customer_match = await self._match_customer_scan(parsed_receipt)
+        
+        if customer_match:
+            await self._process_customer_purchase(customer_match, parsed_receipt)
+        else:
+            logger.info(f"No customer match found for receipt: {parsed_receipt.get('receipt_id', 'unknown')}")
+    
+    async def _wait_stable(self, file_path: str, interval: float = 0.3, tries: int = 5) -> bool:
+        """Wait until the file size stops changing between two samples"""
+        try:
+            size = (await aiofiles.os.stat(file_path)).st_size
+            for _ in range(tries):
+                await asyncio.sleep(interval)
+                new_size = (await aiofiles.os.stat(file_path)).st_size
+                if new_size == size:
+                    return True
+                size = new_size
+        except FileNotFoundError:
+            pass
+        return False
+    
+    def _is_receipt_file(self, file_path: str) -> bool:
+        """Check if file appears to be a receipt"""
+        return os.path.basename(file_path).lower().endswith(RECEIPT_EXTENSIONS)
     
     async def _read_receipt_file(self, file_path: str) -> Optional[str]:
         """Read receipt file content"""
         try:
-            # Try different encodings
-            encodings = ['utf-8', 'cp1252', 'ascii']
+            # Read the file once without blocking the event loop, then try
+            # each encoding on the same bytes
+            async with aiofiles.open(file_path, 'rb') as f:
+                binary_content = await f.read()
             
-            for encoding in encodings:
+            for encoding in RECEIPT_ENCODINGS:
                 try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                        if content.strip():
-                            return content
+                    content = binary_content.decode(encoding)
                 except UnicodeDecodeError:
                     continue
-                    
-            # If text reading fails, try binary mode for special printer formats
-            with open(file_path, 'rb') as f:
-                binary_content = f.read()
-                # Convert printable bytes to string
-                content = ''.join(chr(b) if 32 <= b <= 126 else '\n' for b in binary_content)
+                # Match the newline handling of a text-mode read
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
                 return content if content.strip() else None
+                    
+            # If text decoding fails, keep printable bytes for special printer formats
+            content = binary_content.translate(_PRINT_TABLE).decode('ascii')
+            return content if content.strip() else None
                 
         except Exception as e:
             logger.error(f"Error reading receipt file {file_path}: {e}")
@@ -162,25 +229,14 @@ class ReceiptMonitor:
     
     async def _match_customer_scan(self, receipt_data: Dict) -> Optional[Dict]:
         """Match receipt with recent customer scan"""
-        if not self.websocket_manager.current_customer_scan:
+        customer_scan = self.websocket_manager.current_customer_scan
+        scanned_monotonic = self.websocket_manager.current_scan_monotonic
+        if not customer_scan or scanned_monotonic is None:
             return None
             
-        # Check if scan is within time window
-        scan_time_str = self.websocket_manager.current_customer_scan.get('scanned_at')
-        if not scan_time_str:
-            return None
-            
-        try:
-            scan_time = datetime.fromisoformat(scan_time_str.replace('Z', '+00:00'))
-            current_time = datetime.utcnow()
-            time_diff = (current_time - scan_time).total_seconds()
-            
-            # Check if within matching window
-            if time_diff <= settings.receipt_match_window_seconds:
-                return self.websocket_manager.current_customer_scan
-                
-        except Exception as e:
-            logger.error(f"Error matching customer scan time: {e}")
+        # Check if scan is within matching window
+        if time.monotonic() - scanned_monotonic <= self.match_window_seconds:
+            return customer_scan
             
         return None
     
@@ -209,11 +265,6 @@ class ReceiptMonitor:
         """Background task to process any pending receipts"""
         while self.is_monitoring:
             try:
-                # Clean up old processed files from memory
-                if len(self.processed_files) > 1000:
-                    # Keep only recent files
-                    self.processed_files = set(list(self.processed_files)[-500:])
-                
                 # Sleep for a bit before next check
                 await asyncio.sleep(5)
                 
@@ -237,7 +288,7 @@ class ReceiptMonitor:
         """Get current monitoring status"""
         return {
             "is_monitoring": self.is_monitoring,
-            "monitor_path": settings.receipt_folder_path,
+            "monitor_path": self.monitor_path,
             "processed_files_count": len(self.processed_files),
             "pending_scans": len(self.pending_customer_scans)
         }
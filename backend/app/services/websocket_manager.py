@@ -2,14 +2,33 @@
 WebSocket connection manager for tablet and electron communication
 """
 import asyncio
-import json
 import logging
+import time
 from datetime import datetime
 from typing import Optional, Dict, Any
+import orjson
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+def _dumps(message: Dict[str, Any]) -> str:
+    """Encode an outgoing message with orjson; text frames keep plain WebSocket clients working
+
+    orjson writes datetimes as ISO 8601 strings, the same text isoformat()
+    gives, so messages carry datetime objects and Socket.IO (via main's
+    OrjsonShim) encodes them identically.
+    """
+    return orjson.dumps(message, default=str).decode()
+
+# Messages that never change are built and encoded once; the dicts are
+# shared, so they must not be mutated
+HEARTBEAT_ACK = {"action": "heartbeat_ack"}
+IDLE_STATE = {"action": "set_state", "state": "idle"}
+TABLET_RESET = {"action": "tablet_reset", "tablet_state": "idle"}
+HEARTBEAT_ACK_JSON = _dumps(HEARTBEAT_ACK)
+IDLE_STATE_JSON = _dumps(IDLE_STATE)
+TABLET_RESET_JSON = _dumps(TABLET_RESET)
+
 class WebSocketManager:
     """Manages WebSocket connections between tablet, electron app, and backend"""
     
@@ -17,6 +36,7 @@ class WebSocketManager:
         self.tablet_connection: Optional[WebSocket] = None
         self.electron_connection: Optional[WebSocket] = None
         self.current_customer_scan: Optional[Dict] = None
+        self.current_scan_monotonic: Optional[float] = None  # time.monotonic() of the current scan, for receipt matching
         self.tablet_state = "idle"  # idle, registration, confirmation
         
         # Socket.IO support
@@ -38,7 +58,7 @@ class WebSocketManager:
         await self.send_to_tablet({
             "action": "set_state",
             "state": "idle",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
     async def connect_electron(self, websocket: WebSocket):
@@ -50,7 +70,7 @@ class WebSocketManager:
         # Send connection confirmation
         await self.send_to_electron({
             "action": "connected",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         })
     
     def disconnect_tablet(self):
@@ -64,12 +84,12 @@ class WebSocketManager:
         self.electron_connection = None
         logger.info("Electron app disconnected")
     
-    async def send_to_tablet(self, message: Dict[str, Any]):
-        """Send message to tablet"""
+    async def send_to_tablet(self, message: Dict[str, Any], encoded: Optional[str] = None):
+        """Send message to tablet (encoded: pre-built WebSocket JSON for static messages)"""
         if self.tablet_connection:
             try:
-                await self.tablet_connection.send_json(message)
-                logger.debug(f"Sent to tablet via WebSocket: {message}")
+                await self.tablet_connection.send_text(encoded or _dumps(message))
+                logger.debug("Sent to tablet via WebSocket: %s", message)
             except Exception as e:
                 logger.error(f"Error sending to tablet via WebSocket: {e}")
                 self.tablet_connection = None
@@ -78,16 +98,16 @@ class WebSocketManager:
         if self.sio_server and self.tablet_sid:
             try:
                 await self.sio_server.emit('tablet_message', message, room=self.tablet_sid)
-                logger.debug(f"Sent to tablet via Socket.IO: {message}")
+                logger.debug("Sent to tablet via Socket.IO: %s", message)
             except Exception as e:
                 logger.error(f"Error sending to tablet via Socket.IO: {e}")
     
-    async def send_to_electron(self, message: Dict[str, Any]):
-        """Send message to Electron app"""
+    async def send_to_electron(self, message: Dict[str, Any], encoded: Optional[str] = None):
+        """Send message to Electron app (encoded: pre-built WebSocket JSON for static messages)"""
         if self.electron_connection:
             try:
-                await self.electron_connection.send_json(message)
-                logger.debug(f"Sent to Electron via WebSocket: {message}")
+                await self.electron_connection.send_text(encoded or _dumps(message))
+                logger.debug("Sent to Electron via WebSocket: %s", message)
             except Exception as e:
                 logger.error(f"Error sending to Electron via WebSocket: {e}")
                 self.electron_connection = None
@@ -96,26 +116,26 @@ class WebSocketManager:
         if self.sio_server and self.electron_sid:
             try:
                 await self.sio_server.emit('electron_message', message, room=self.electron_sid)
-                logger.debug(f"Sent to Electron via Socket.IO: {message}")
+                logger.debug("Sent to Electron via Socket.IO: %s", message)
             except Exception as e:
                 logger.error(f"Error sending to Electron via Socket.IO: {e}")
     
     async def handle_tablet_message(self, data: Dict[str, Any]):
         """Handle message from tablet"""
         action = data.get("action")
-        logger.info(f"Received from tablet: {action}")
+        logger.info("Received from tablet: %s", action)
         
         if action == "submit_customer_form":
             await self._handle_customer_registration(data.get("data", {}))
         elif action == "reset_to_idle":
             await self._reset_to_idle()
         elif action == "heartbeat":
-            await self.send_to_tablet({"action": "heartbeat_ack"})
+            await self.send_to_tablet(HEARTBEAT_ACK, HEARTBEAT_ACK_JSON)
     
     async def handle_electron_message(self, data: Dict[str, Any]):
         """Handle message from Electron app"""
         action = data.get("action")
-        logger.info(f"Received from Electron: {action}")
+        logger.info("Received from Electron: %s", action)
         
         if action == "start_registration":
             await self._start_customer_registration()
@@ -148,7 +168,7 @@ class WebSocketManager:
             await self.send_to_electron({
                 "action": "process_customer_registration",
                 "customer_data": customer_data,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.utcnow()
             })
             
             # Show confirmation on tablet
@@ -175,8 +195,9 @@ class WebSocketManager:
         """Handle customer barcode scan"""
         self.current_customer_scan = {
             "barcode": barcode,
-            "scanned_at": datetime.utcnow().isoformat()
+            "scanned_at": datetime.utcnow()
         }
+        self.current_scan_monotonic = time.monotonic()
         
         # Show customer info on tablet
         await self.send_to_tablet({
@@ -205,26 +226,40 @@ class WebSocketManager:
         self.tablet_state = "idle"
         self.current_customer_scan = None
         
-        await self.send_to_tablet({
-            "action": "set_state",
-            "state": "idle"
-        })
-        
-        await self.send_to_electron({
-            "action": "tablet_reset",
-            "tablet_state": self.tablet_state
-        })
+        await self.send_to_tablet(IDLE_STATE, IDLE_STATE_JSON)
+        await self.send_to_electron(TABLET_RESET, TABLET_RESET_JSON)
     
     async def broadcast_system_status(self, status: Dict):
         """Broadcast system status to all connected clients"""
         message = {
             "action": "system_status",
             "status": status,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
         
-        await self.send_to_tablet(message)
-        await self.send_to_electron(message)
+        # Encode once and write to both WebSocket clients concurrently
+        payload = _dumps(message)
+        targets = [
+            (name, ws) for name, ws in (("tablet", self.tablet_connection), ("electron", self.electron_connection))
+            if ws is not None
+        ]
+        results = await asyncio.gather(*(ws.send_text(payload) for _, ws in targets), return_exceptions=True)
+        for (name, ws), result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error broadcasting to {name} via WebSocket: {result}")
+                if name == "tablet" and self.tablet_connection is ws:
+                    self.tablet_connection = None
+                elif name == "electron" and self.electron_connection is ws:
+                    self.electron_connection = None
+        
+        # Also send via Socket.IO if available
+        if self.sio_server:
+            for event, sid in (("tablet_message", self.tablet_sid), ("electron_message", self.electron_sid)):
+                if sid:
+                    try:
+                        await self.sio_server.emit(event, message, room=sid)
+                    except Exception as e:
+                        logger.error(f"Error broadcasting {event} via Socket.IO: {e}")
     
     def get_connection_status(self) -> Dict:
         """Get current connection status"""
@@ -2,10 +2,14 @@
 Configuration settings for the loyalty system
 """
 import os
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 class Settings(BaseSettings):
+    # Settings are read once at startup and never mutated
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, frozen=True)
+    
     # Application settings
     app_name: str = "Tienda Loyalty System"
     debug: bool = False
@@ -14,6 +18,11 @@ class Settings(BaseSettings):
     
     # Database settings
     database_url: str = "sqlite+aiosqlite:///./loyalty_system.db"
+    sql_echo: bool = False
+    db_pool_size: int = 25
+    db_max_overflow: int = 25
+    db_pool_recycle_seconds: int = 1800
+    db_pool_prewarm: int = 10
     
     # Receipt monitoring settings
     receipt_monitor_enabled: bool = True
@@ -37,10 +46,11 @@ class Settings(BaseSettings):
     # Tablet UI settings
     tablet_idle_timeout_seconds: int = 30
     tablet_form_timeout_seconds: int = 120
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
 
-# Create global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings, reading .env and the environment once"""
+    return Settings()
+
+# Global settings instance, kept for existing imports
+settings = get_settings()
@@ -3,40 +3,63 @@ Receipt parsing utilities for extracting transaction data
 """
 import re
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, Dict, List
-from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
 class ReceiptParser:
     """Parse receipt text to extract transaction information"""
     
-    # Common receipt patterns
-    TOTAL_PATTERNS = [
-        r'TOTAL\s*:?\s*\$?(\d+\.\d{2})',
-        r'Total\s*:?\s*\$?(\d+\.\d{2})',
-        r'AMOUNT\s*:?\s*\$?(\d+\.\d{2})',
-        r'Grand Total\s*:?\s*\$?(\d+\.\d{2})',
-    ]
-    
-    RECEIPT_ID_PATTERNS = [
-        r'Receipt\s*#?\s*:?\s*([A-Z0-9]+)',
-        r'Transaction\s*#?\s*:?\s*([A-Z0-9]+)',
-        r'REF\s*#?\s*:?\s*([A-Z0-9]+)',
-        r'Invoice\s*#?\s*:?\s*([A-Z0-9]+)',
-    ]
-    
-    DATE_PATTERNS = [
-        r'(\d{1,2}/\d{1,2}/\d{4})',
-        r'(\d{4}-\d{2}-\d{2})',
-        r'(\d{2}-\d{2}-\d{4})',
-    ]
-    
-    TIME_PATTERNS = [
-        r'(\d{1,2}:\d{2}:\d{2})',
-        r'(\d{1,2}:\d{2}\s*[AP]M)',
-    ]
+    # Common receipt patterns, compiled once at class load and kept in
+    # immutable tuples shared by every parser. Matching is
+    # case-insensitive, so 'TOTAL' also covers 'Total' and 'Grand Total'
+    TOTAL_PATTERNS = (
+        re.compile(r'TOTAL\s*:?\s*\$?(\d+\.\d{2})', re.IGNORECASE),
+        re.compile(r'AMOUNT\s*:?\s*\$?(\d+\.\d{2})', re.IGNORECASE),
+    )
+    
+    RECEIPT_ID_PATTERNS = (
+        re.compile(r'Receipt\s*#?\s*:?\s*([A-Z0-9]+)', re.IGNORECASE),
+        re.compile(r'Transaction\s*#?\s*:?\s*([A-Z0-9]+)', re.IGNORECASE),
+        re.compile(r'REF\s*#?\s*:?\s*([A-Z0-9]+)', re.IGNORECASE),
+        re.compile(r'Invoice\s*#?\s*:?\s*([A-Z0-9]+)', re.IGNORECASE),
+    )
+    
+    DATE_PATTERNS = (
+        re.compile(r'(\d{1,2}/\d{1,2}/\d{4})'),
+        re.compile(r'(\d{4}-\d{2}-\d{2})'),
+        re.compile(r'(\d{2}-\d{2}-\d{4})'),
+    )
+    
+    TIME_PATTERNS = (
+        re.compile(r'(\d{1,2}:\d{2}:\d{2})'),
+        re.compile(r'(\d{1,2}:\d{2}\s*[AP]M)'),
+    )
+    
+    # Words that suggest a text is a receipt, most common first so the
+    # validity check usually stops after the first couple of searches
+    RECEIPT_INDICATORS = (
+        'total', 'subtotal', 'tax', 'receipt',
+        'thank you', 'change', 'payment', 'transaction'
+    )
+    
+    # Item names containing these look like summary lines, not items
+    NON_ITEM_KEYWORDS = ('total', 'subtotal', 'tax', 'change')
+    
+    # Common item line patterns
+    ITEM_PATTERNS = (
+        re.compile(r'(\w+.*?)\s+(\d+\.\d{2})'),  # Item name followed by price
+        re.compile(r'(\w+.*?)\s+\$(\d+\.\d{2})'),  # Item name followed by $price
+    )
+    
+    # Parsing is pure, so the fields extracted from recently seen texts are
+    # shared by all parsers; a rewritten spool file or a reprint hands the
+    # same text over again. The cached items list is shared between
+    # results and must not be modified by callers
+    PARSE_CACHE_SIZE = 64
+    _parse_cache: "OrderedDict[str, Dict]" = OrderedDict()
     
     def parse_receipt(self, receipt_text: str) -> Dict:
         """
@@ -51,24 +74,15 @@ class ReceiptParser:
         try:
             parsed_data = {
                 'raw_text': receipt_text,
-                'total': self._extract_total(receipt_text),
-                'receipt_id': self._extract_receipt_id(receipt_text),
-                'date': self._extract_date(receipt_text),
-                'time': self._extract_time(receipt_text),
-                'items': self._extract_items(receipt_text),
-                'items_count': 0,
+                **self._parse_fields(receipt_text),
                 'parsed_at': datetime.utcnow()
             }
             
-            # Count items
-            if parsed_data['items']:
-                parsed_data['items_count'] = len(parsed_data['items'])
-            
-            logger.info(f"Parsed receipt - Total: ${parsed_data['total']}, Items: {parsed_data['items_count']}")
+            logger.info("Parsed receipt - Total: $%s, Items: %s", parsed_data['total'], parsed_data['items_count'])
             return parsed_data
             
         except Exception as e:
-            logger.error(f"Error parsing receipt: {e}")
+            logger.error("Error parsing receipt: %s", e)
             return {
                 'raw_text': receipt_text,
                 'total': 0.0,
@@ -77,10 +91,39 @@ class ReceiptParser:
                 'parsed_at': datetime.utcnow()
             }
     
+    def _parse_fields(self, text: str) -> Dict:
+        """Extract the fields derived from the text, reusing recent results"""
+        fields = self._parse_cache.get(text)
+        if fields is not None:
+            self._parse_cache.move_to_end(text)
+            return fields
+        
+        items = self._extract_items(text)
+        fields = {
+            'total': self._extract_total(text),
+            'receipt_id': self._extract_receipt_id(text),
+            'date': self._extract_date(text),
+            'time': self._extract_time(text),
+            'items': items,
+            'items_count': len(items)
+        }
+        
+        # Evict the least recently used text once the cap is reached
+        self._parse_cache[text] = fields
+        if len(self._parse_cache) > self.PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False)
+        return fields
+    
     def _extract_total(self, text: str) -> float:
         """Extract total amount from receipt"""
+        # Both patterns start with a literal keyword; a plain substring
+        # search rejects text without either before any regex runs
+        text_lower = text.lower()
+        if 'total' not in text_lower and 'amount' not in text_lower:
+            return 0.0
+        
         for pattern in self.TOTAL_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE)
+            match = pattern.search(text)
             if match:
                 try:
                     return float(match.group(1))
@@ -91,7 +134,7 @@ class ReceiptParser:
     def _extract_receipt_id(self, text: str) -> Optional[str]:
         """Extract receipt ID from receipt"""
         for pattern in self.RECEIPT_ID_PATTERNS:
-            match = re.search(pattern, text, re.IGNORECASE)
+            match = pattern.search(text)
             if match:
                 return match.group(1)
         return None
@@ -99,7 +142,7 @@ class ReceiptParser:
     def _extract_date(self, text: str) -> Optional[str]:
         """Extract date from receipt"""
         for pattern in self.DATE_PATTERNS:
-            match = re.search(pattern, text)
+            match = pattern.search(text)
             if match:
                 return match.group(1)
         return None
@@ -107,7 +150,7 @@ class ReceiptParser:
     def _extract_time(self, text: str) -> Optional[str]:
         """Extract time from receipt"""
         for pattern in self.TIME_PATTERNS:
-            match = re.search(pattern, text)
+            match = pattern.search(text)
             if match:
                 return match.group(1)
         return None
@@ -116,26 +159,38 @@ class ReceiptParser:
         """Extract individual items from receipt"""
         items = []
         
-        # Common item line patterns
-        item_patterns = [
-            r'(\w+.*?)\s+(\d+\.\d{2})',  # Item name followed by price
-            r'(\w+.*?)\s+\$(\d+\.\d{2})',  # Item name followed by $price
-        ]
-        
         lines = text.split('\n')
         for line in lines:
             line = line.strip()
-            if not line or len(line) < 5:
+            # Every item pattern needs a decimal price, so a line without a
+            # '.' can be rejected before any regex runs
+            if not line or len(line) < 5 or '.' not in line:
                 continue
+            
+            # Fast path for the usual "name  price" / "name  $price" line:
+            # with no '.' before the last token, that token is the only
+            # place ITEM_PATTERNS could find a price, so split by hand
+            head_tail = line.rsplit(None, 1)
+            if len(head_tail) == 2 and '.' not in head_tail[0] and (line[0].isalnum() or line[0] == '_'):
+                item_name, price = head_tail
+                whole, dot, cents = price[1:].partition('.') if price.startswith('$') else price.partition('.')
+                if dot and whole.isdecimal() and len(cents) == 2 and cents.isdecimal():
+                    if not any(keyword in item_name.lower() for keyword in self.NON_ITEM_KEYWORDS):
+                        items.append({
+                            'name': item_name,
+                            'price': float(f"{whole}.{cents}"),
+                            'line': line
+                        })
+                    continue
                 
-            for pattern in item_patterns:
-                match = re.search(pattern, line)
+            for pattern in self.ITEM_PATTERNS:
+                match = pattern.search(line)
                 if match:
                     item_name = match.group(1).strip()
                     item_price = float(match.group(2))
                     
                     # Skip if it looks like a total line
-                    if any(keyword in item_name.lower() for keyword in ['total', 'subtotal', 'tax', 'change']):
+                    if any(keyword in item_name.lower() for keyword in self.NON_ITEM_KEYWORDS):
                         continue
                         
                     items.append({
@@ -152,14 +207,18 @@ class ReceiptParser:
         if not receipt_text or len(receipt_text.strip()) < 20:
             return False
             
-        # Check for receipt indicators
-        receipt_indicators = [
-            'total', 'receipt', 'thank you', 'transaction',
-            'subtotal', 'tax', 'change', 'payment'
-        ]
-        
+        # Must have at least 2 receipt indicators; each `in` is a single C
+        # substring search, overlapping words like subtotal/total both
+        # count, and the scan stops as soon as the second one is found
         text_lower = receipt_text.lower()
-        indicators_found = sum(1 for indicator in receipt_indicators if indicator in text_lower)
+        indicators_found = 0
+        for indicator in self.RECEIPT_INDICATORS:
+            if indicator in text_lower:
+                indicators_found += 1
+                if indicators_found >= 2:
+                    break
+        else:
+            return False
         
-        # Must have at least 2 receipt indicators and a valid total
-        return indicators_found >= 2 and self._extract_total(receipt_text) > 0
+        # ...and a valid total
+        return self._extract_total(receipt_text) > 0
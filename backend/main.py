@@ -3,23 +3,24 @@ Main FastAPI application entry point for the Loyalty System
 """
 import asyncio
 import logging
+import orjson
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 import socketio
 from app.models.database import init_db
 from app.routes import customers, purchases, admin
 from app.services.websocket_manager import WebSocketManager
 from app.services.receipt_monitor import ReceiptMonitor
-from app.utils.config import Settings
+from app.utils.config import get_settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize settings
-settings = Settings()
+settings = get_settings()
 
 # WebSocket manager
 ws_manager = WebSocketManager()
@@ -27,12 +28,27 @@ ws_manager = WebSocketManager()
 # Receipt monitor
 receipt_monitor = ReceiptMonitor(ws_manager)
 
+class OrjsonShim:
+    """json-module stand-in so Socket.IO/Engine.IO packets go through orjson"""
+    
+    @staticmethod
+    def dumps(obj, **kwargs):
+        # orjson output is already compact, so separators and similar
+        # json.dumps options need no translation
+        return orjson.dumps(obj, default=str).decode()
+    
+    @staticmethod
+    def loads(data, **kwargs):
+        return orjson.loads(data)
+
 # Create Socket.IO server
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True
+    json=OrjsonShim,
+    # Per-packet Socket.IO/Engine.IO logging only in debug runs
+    logger=settings.debug,
+    engineio_logger=settings.debug
 )
 
 # Set Socket.IO server in WebSocket manager
@@ -42,13 +58,13 @@ ws_manager.set_socketio_server(sio)
 @sio.event
 async def connect(sid, environ, auth):
     """Handle Socket.IO client connection"""
-    logger.info(f"Socket.IO client connected: {sid}")
+    logger.info("Socket.IO client connected: %s", sid)
     await sio.emit('connected', {'status': 'connected'}, room=sid)
 
 @sio.event
 async def disconnect(sid):
     """Handle Socket.IO client disconnection"""
-    logger.info(f"Socket.IO client disconnected: {sid}")
+    logger.info("Socket.IO client disconnected: %s", sid)
     # Clean up any stored client references
     if ws_manager.tablet_sid == sid:
         ws_manager.tablet_sid = None
@@ -59,7 +75,7 @@ async def disconnect(sid):
 async def identify_client(sid, data):
     """Handle client identification"""
     client_type = data.get('type', 'unknown')
-    logger.info(f"Client {sid} identified as: {client_type}")
+    logger.info("Client %s identified as: %s", sid, client_type)
     
     if client_type == 'tablet':
         ws_manager.tablet_sid = sid
@@ -68,37 +84,35 @@ async def identify_client(sid, data):
         ws_manager.electron_sid = sid
         await sio.emit('electron_connected', {'status': 'connected'}, room=sid)
 
+# Generic Socket.IO message actions; each handler takes (sid, data) and
+# returns an awaitable
+MESSAGE_HANDLERS = {
+    'start_registration': lambda sid, data: ws_manager._start_customer_registration(),
+    'customer_scanned': lambda sid, data: ws_manager._handle_customer_scan(data.get('barcode', '')),
+    'submit_customer_form': lambda sid, data: ws_manager._handle_customer_registration(data.get('data', {})),
+    'reset_to_idle': lambda sid, data: ws_manager._reset_to_idle(),
+    'heartbeat': lambda sid, data: sio.emit('heartbeat_ack', room=sid),
+}
+
 @sio.event
 async def message(sid, data):
     """Handle generic message from Socket.IO clients"""
-    logger.info(f"Received message from {sid}: {data}")
-    
-    # Handle different client types based on the path or data
-    action = data.get('action', '')
+    logger.debug("Received message from %s: %s", sid, data)
     
-    if action == 'start_registration':
-        await ws_manager._start_customer_registration()
-    elif action == 'customer_scanned':
-        barcode = data.get('barcode', '')
-        await ws_manager._handle_customer_scan(barcode)
-    elif action == 'submit_customer_form':
-        customer_data = data.get('data', {})
-        await ws_manager._handle_customer_registration(customer_data)
-    elif action == 'reset_to_idle':
-        await ws_manager._reset_to_idle()
-    elif action == 'heartbeat':
-        await sio.emit('heartbeat_ack', room=sid)
+    handler = MESSAGE_HANDLERS.get(data.get('action', ''))
+    if handler:
+        await handler(sid, data)
 
 @sio.on('tablet_message')
 async def handle_tablet_message(sid, data):
     """Handle messages specifically from tablet"""
-    logger.info(f"Tablet message from {sid}: {data}")
+    logger.debug("Tablet message from %s: %s", sid, data)
     await ws_manager.handle_tablet_message(data)
 
 @sio.on('electron_message')
 async def handle_electron_message(sid, data):
     """Handle messages specifically from Electron app"""
-    logger.info(f"Electron message from {sid}: {data}")
+    logger.debug("Electron message from %s: %s", sid, data)
     await ws_manager.handle_electron_message(data)
 
 @asynccontextmanager
@@ -122,7 +136,8 @@ app = FastAPI(
     title="Tienda Loyalty System",
     description="Backend API for hybrid loyalty enrollment system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Mount Socket.IO app
@@ -158,7 +173,7 @@ async def websocket_tablet_endpoint(websocket: WebSocket):
     await ws_manager.connect_tablet(websocket)
     try:
         while True:
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             await ws_manager.handle_tablet_message(data)
     except WebSocketDisconnect:
         ws_manager.disconnect_tablet()
@@ -171,7 +186,7 @@ async def websocket_electron_endpoint(websocket: WebSocket):
     await ws_manager.connect_electron(websocket)
     try:
         while True:
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             await ws_manager.handle_electron_message(data)
     except WebSocketDisconnect:
         ws_manager.disconnect_electron()
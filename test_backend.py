@@ -41,7 +41,6 @@ async def test_imports():
         await init_db()
         print("✅ Database initialization successful")
         
-        print("\n🎉 All tests passed! The backend should start correctly.")
         return True
         
     except Exception as e:
@@ -50,6 +49,56 @@ async def test_imports():
         traceback.print_exc()
         return False
 
+async def test_receipt_monitor_slow_write():
+    """Test that a receipt spooled in many slow writes is still parsed in full"""
+    import tempfile
+    try:
+        print("Testing receipt monitor with a slow multi-write file...")
+        
+        from app.services.receipt_monitor import ReceiptMonitor
+        from app.services.websocket_manager import WebSocketManager
+        
+        monitor = ReceiptMonitor(WebSocketManager())
+        parsed = []
+        parse_receipt = monitor.receipt_parser.parse_receipt
+        monitor.receipt_parser.parse_receipt = lambda text: parsed.append(text) or parse_receipt(text)
+        
+        # Writes land 0.27s apart: the stability check (five 0.3s samples)
+        # sees the file grow on every sample and gives up, and the last
+        # write arrives while it is still sampling. Each write raises one
+        # modified event, as watchdog would
+        chunks = ["Receipt #SLOW1\n"] + [f"Item {i}  1.00\n" for i in range(4)] + ["TOTAL: $4.00\nThank you\n"]
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, "slow_receipt.txt")
+            events = []
+            for chunk in chunks:
+                with open(file_path, "a") as f:
+                    f.write(chunk)
+                events.append(asyncio.create_task(monitor.process_modified_file(file_path)))
+                await asyncio.sleep(0.27)
+            await asyncio.gather(*events)
+        
+        if parsed != ["".join(chunks)]:
+            print(f"❌ Expected one parse of the complete receipt, got {len(parsed)}")
+            return False
+        
+        print("✅ Slow multi-write receipt parsed once, in full")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error during testing: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+async def run_tests():
+    """Run every check, stopping at the first failure"""
+    if not (await test_imports() and await test_receipt_monitor_slow_write()):
+        return False
+    
+    print("\n🎉 All tests passed! The backend should start correctly.")
+    return True
+
 if __name__ == "__main__":
-    success = asyncio.run(test_imports())
+    success = asyncio.run(run_tests())
     sys.exit(0 if success else 1)